@@ -1,13 +1,143 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
 import log_analyzer as la
 
-@st.cache_data
-def load_data(uploaded_file):
-    """Loads and processes the log file."""
-    df = la.parse_log_file(uploaded_file)
+@st.cache_data(show_spinner="Parsing log file...", max_entries=8, persist="disk")
+def load_data(file_bytes):
+    """Loads and processes the log file. Keyed on the raw bytes, so identical uploads hit the cache."""
+    df = la.parse_log_file(io.BytesIO(file_bytes))
+    df.attrs['content_hash'] = hashlib.blake2b(file_bytes).hexdigest()
     return df
 
+def frame_fingerprint(df):
+    """
+    Cheap identity for a parsed log, so cached helpers don't hash the whole frame.
+    The hash of the uploaded bytes keeps two logs with the same shape and time span apart.
+    """
+    return (df.attrs.get('content_hash'), df.shape, df['timestamp'].iloc[0], df['timestamp'].iloc[-1])
+
+FRAME_HASH_FUNCS = {pd.DataFrame: frame_fingerprint}
+
+@st.cache_data(max_entries=4, show_spinner=False, hash_funcs=FRAME_HASH_FUNCS)
+def load_analyses(df):
+    """
+    Runs the independent analyzers for one log. Alarm analysis runs in a worker
+    thread while the figure-producing analyzers stay on this thread, since pyplot
+    is not thread-safe.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        alarms_future = executor.submit(la.analyze_alarms, df)
+        performance = la.analyze_transaction_performance(df)
+        frequency = la.analyze_event_frequency(df)
+        alarms = alarms_future.result()
+    return performance, frequency, alarms
+
+@st.cache_data(show_spinner=False, hash_funcs=FRAME_HASH_FUNCS)
+def load_issues(df):
+    """Runs the alarm analysis and labels each issue for the drill-down selector."""
+    issue_summary, all_issues = load_analyses(df)[2]
+    if all_issues is not None and not all_issues.empty:
+        all_issues = all_issues.copy()
+        all_issues['display'] = all_issues['timestamp'].dt.strftime("%Y-%m-%d %H:%M:%S.%f") + " - " + all_issues['Message'].astype(str).str.slice(0, 80)
+    return issue_summary, all_issues
+
+@st.cache_data(max_entries=4, show_spinner=False, hash_funcs=FRAME_HASH_FUNCS)
+def export_parquet(df):
+    """Serializes the enriched data to Parquet for download."""
+    return df.to_parquet(index=False)
+
+@st.cache_data(max_entries=64, show_spinner=False, hash_funcs=FRAME_HASH_FUNCS)
+def load_event_context(df, event_timestamp):
+    """Collects the log timeline and identifier context around one event."""
+    return la.get_context_around_event(df, event_timestamp)
+
+@st.fragment
+def render_operational_tab(df):
+    """Renders the operational analysis tab; its widgets rerun only this fragment."""
+    st.header("Operational Overview")
+    sub_tab1, sub_tab2, sub_tab3 = st.tabs(["Transaction Performance", "Event Frequency", "Advanced Audits"])
+    
+    (perf_stats, perf_fig), (top_messages, freq_fig), _ = load_analyses(df)
+
+    with sub_tab1:
+        if perf_stats is not None:
+            st.subheader("Transaction Process Time Analysis")
+            st.dataframe(perf_stats)
+            st.pyplot(perf_fig)
+        else:
+            st.warning("No process time data found.")
+
+    with sub_tab2:
+        if top_messages is not None:
+            st.subheader("Event and Message Frequency")
+            st.dataframe(top_messages)
+            st.pyplot(freq_fig)
+        else:
+            st.warning("No 'MessageName' data available.")
+    
+    with sub_tab3:
+        st.subheader("Transaction Lifecycle Audit")
+        # ... (Lifecycle audit code remains the same)
+
+        st.subheader("Automated Performance Anomaly Detection")
+        # ... (Anomaly detection code remains the same)
+
+@st.fragment
+def render_maintenance_tab(df):
+    """Renders the maintenance tab; its widgets rerun only this fragment."""
+    st.header("Maintenance & Downtime Analysis")
+    
+    # --- NEW: CURRENT STATE SNAPSHOT ---
+    st.subheader("Current State Snapshot (at end of log)")
+    snap_cols = st.columns(4)
+    
+    # Last known value for each key identifier, recorded while parsing
+    last_state = df.attrs.get('last_state', {})
+    
+    snap_cols[0].metric("Control State", last_state.get('ControlState', 'N/A'))
+    snap_cols[1].metric("Operator ID", last_state.get('OperatorID', 'N/A'))
+    snap_cols[2].metric("Lot ID", last_state.get('LotID', 'N/A'))
+    snap_cols[3].metric("Magazine ID", last_state.get('MagazineID', 'N/A'))
+
+    st.divider()
+
+    issue_summary, all_issues = load_issues(df)
+    
+    if issue_summary is None:
+        st.success("No alarms, errors, or protocol issues were detected in this log file.")
+    else:
+        st.subheader("🚨 Potential Machine-Halting Events")
+        halting_events = la.find_halting_events(df, all_issues)
+        if not halting_events.empty:
+            st.write("These are critical issues that were followed by a period of NO processing activity, indicating a potential machine halt.")
+            st.dataframe(halting_events[['timestamp', 'Message', 'TransactionID']])
+        else:
+            st.info("No events were directly correlated with a machine halt in this log.")
+
+        st.subheader("All Detected Issues & Alarms")
+        st.dataframe(issue_summary)
+
+        st.subheader("Downtime Event Drill-Down")
+        if not all_issues.empty:
+            issue_labels = all_issues['display'].tolist()
+            selected_event_pos = st.selectbox("Select an Issue/Alarm Event:", options=range(len(issue_labels)), format_func=issue_labels.__getitem__, key="alarm_select")
+
+            if selected_event_pos is not None:
+                selected_event_row = all_issues.iloc[selected_event_pos]
+                context_logs, context_data = load_event_context(df, selected_event_row['timestamp'])
+                
+                st.write("#### Context at Time of Event")
+                st.json(context_data)
+
+                st.write(f"#### Log Timeline (5 minutes before and after the event)")
+                st.dataframe(context_logs)
+        else:
+            st.info("No specific alarm events to select.")
+
 st.set_page_config(layout="wide")
 st.title("SECS/GEM Log Analysis Dashboard")
 
@@ -17,7 +147,7 @@ uploaded_file = st.sidebar.file_uploader("Choose a log file (.txt)", type="txt")
 if uploaded_file is None:
     st.info("Please upload a log file using the sidebar to begin analysis.")
 else:
-    df = load_data(uploaded_file)
+    df = load_data(uploaded_file.getvalue())
 
     if df.empty:
         st.error("Could not parse any data from the uploaded file. Please check the file format.")
@@ -30,91 +160,21 @@ else:
         col2.metric("Log Start Time (UTC)", summary['Start Time'].strftime("%H:%M:%S"))
         col3.metric("Log End Time (UTC)", summary['End Time'].strftime("%H:%M:%S"))
         
-        if 'Message' in df.columns:
-            panels_processed = df['Message'].str.contains("UnloadedFromTool|LoadedToToolCompleted", case=False, na=False).sum()
+        if 'is_panel_event' in df.columns:
+            panels_processed = int(df['is_panel_event'].sum())
             col4.metric("Panels Processed", f"{panels_processed:,}")
 
         # --- Main Tabs ---
         op_tab, maint_tab = st.tabs(["Operational Analysis", "Maintenance & Alarm Analysis"])
 
         with op_tab:
-            st.header("Operational Overview")
-            sub_tab1, sub_tab2, sub_tab3 = st.tabs(["Transaction Performance", "Event Frequency", "Advanced Audits"])
-            
-            with sub_tab1:
-                perf_stats, perf_fig = la.analyze_transaction_performance(df)
-                if perf_stats is not None:
-                    st.subheader("Transaction Process Time Analysis")
-                    st.dataframe(perf_stats)
-                    st.pyplot(perf_fig)
-                else:
-                    st.warning("No process time data found.")
-
-            with sub_tab2:
-                top_messages, freq_fig = la.analyze_event_frequency(df)
-                if top_messages is not None:
-                    st.subheader("Event and Message Frequency")
-                    st.dataframe(top_messages)
-                    st.pyplot(freq_fig)
-                else:
-                    st.warning("No 'MessageName' data available.")
-            
-            with sub_tab3:
-                st.subheader("Transaction Lifecycle Audit")
-                # ... (Lifecycle audit code remains the same)
-
-                st.subheader("Automated Performance Anomaly Detection")
-                # ... (Anomaly detection code remains the same)
-        
+            render_operational_tab(df)
+
         with maint_tab:
-            st.header("Maintenance & Downtime Analysis")
-            
-            # --- NEW: CURRENT STATE SNAPSHOT ---
-            st.subheader("Current State Snapshot (at end of log)")
-            snap_cols = st.columns(4)
-            
-            # Find the last known value for each key identifier
-            last_state = {col: df[col].dropna().iloc[-1] for col in ['ControlState', 'OperatorID', 'LotID', 'MagazineID'] if col in df.columns and not df[col].dropna().empty}
-            
-            snap_cols[0].metric("Control State", last_state.get('ControlState', 'N/A'))
-            snap_cols[1].metric("Operator ID", last_state.get('OperatorID', 'N/A'))
-            snap_cols[2].metric("Lot ID", last_state.get('LotID', 'N/A'))
-            snap_cols[3].metric("Magazine ID", last_state.get('MagazineID', 'N/A'))
-
-            st.divider()
-
-            issue_summary, all_issues = la.analyze_alarms(df)
-            
-            if issue_summary is None:
-                st.success("No alarms, errors, or protocol issues were detected in this log file.")
-            else:
-                st.subheader("🚨 Potential Machine-Halting Events")
-                halting_events = la.find_halting_events(df, all_issues)
-                if not halting_events.empty:
-                    st.write("These are critical issues that were followed by a period of NO processing activity, indicating a potential machine halt.")
-                    st.dataframe(halting_events[['timestamp', 'Message', 'TransactionID']])
-                else:
-                    st.info("No events were directly correlated with a machine halt in this log.")
-
-                st.subheader("All Detected Issues & Alarms")
-                st.dataframe(issue_summary)
-
-                st.subheader("Downtime Event Drill-Down")
-                if not all_issues.empty:
-                    all_issues['display'] = all_issues['timestamp'].astype(str) + " - " + all_issues['Message']
-                    selected_event_display = st.selectbox("Select an Issue/Alarm Event:", options=all_issues['display'], key="alarm_select")
-
-                    if selected_event_display:
-                        selected_event_row = all_issues[all_issues['display'] == selected_event_display].iloc[0]
-                        context_logs, context_data = la.get_context_around_event(df, selected_event_row['timestamp'])
-                        
-                        st.write("#### Context at Time of Event")
-                        st.json(context_data)
-
-                        st.write(f"#### Log Timeline (5 minutes before and after the event)")
-                        st.dataframe(context_logs)
-                else:
-                    st.info("No specific alarm events to select.")
-
-        with st.expander("Show Full Enriched Data (Raw)"):
-            st.dataframe(df)
+            render_maintenance_tab(df)
+
+        # --- Raw Data ---
+        # Only serialize the raw frame to the browser when asked for, and cap the preview
+        if st.checkbox("Show Full Enriched Data (Raw, first 50,000 rows)", key="show_raw"):
+            st.dataframe(df.head(50_000))
+        st.download_button("Download Full Enriched Data (Parquet)", data=export_parquet(df), file_name="enriched_log.parquet", mime="application/octet-stream")
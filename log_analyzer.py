@@ -1,81 +1,272 @@
+import collections
+import io
+import itertools
+import multiprocessing
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# matplotlib and seaborn are imported inside the plotting functions that need them,
+# so parsing (including in worker processes) doesn't pay their import cost.
+
+# Number of log lines parsed per batch when streaming an uploaded file
+CHUNK_LINES = 65536
+
+# Parallel parsing only starts once a file spans this many batches; each spawned worker spends
+# about half a second importing pandas and pyarrow before it parses anything.
+POOL_MIN_BATCHES = 4
+
+# Upper bound on parser worker processes, which also bounds the batches held in flight
+MAX_PARSE_WORKERS = 4
+
+# Header of a log line: timestamp, [log type], then key=value details. Multiline so one
+# finditer over a whole batch of lines finds every entry.
+LOG_LINE_PATTERN = re.compile(
+    r'^[ \t]*(?P<timestamp>\d{4}/\d{2}/\d{2}\s\d{2}:\d{2}:\d{2}\.\d{6}),'
+    r'\[(?P<log_type>[^\]]+)\],'
+    r'(?P<details>[^\r\n]*)',
+    re.MULTILINE
+)
+
+# Splits a details payload at each 'Key=' marker
+DETAILS_KEY_PATTERN = re.compile(r'(\w+=)')
+
+# Patterns run over 'Message' with Arrow's RE2-based extract_regex, so they are plain strings
+# with exactly one named group.
+
+# Transaction duration reported in a 'Message'
+PROCESS_TIME_PATTERN = r"Process time of the transaction\(ID=\d+\) is (?P<ProcessTime_ms>[\d.-]+) msec"
+
+# Messages that mark a panel being loaded to or unloaded from the tool (matched case-insensitively).
+# Kept as a plain string so Arrow-backed string columns can run it with their own regex kernel.
+PANEL_EVENT_PATTERN = r"UnloadedFromTool|LoadedToToolCompleted"
+
+# Machine control state announced in a 'Message'
+CONTROL_STATE_PATTERN = r"(?P<ControlState>LOCAL|REMOTE)"
+
+# Identifiers inside the SML body of a 'Message', one pattern per field. LotID uses a negated
+# class rather than lazy '.*?' so a failed attempt can't run across neighbouring items.
+DEEP_PARSE_PATTERNS = {
+    'OperatorID': r'<A\[\d+\] "(?P<OperatorID>\d{5})" > // OperatorID',
+    'MagazineID': r'<A\[\d+\] "(?P<MagazineID>M\d+)" > // MagazineID',
+    'LotID': r'<A\[\d+\] "(?P<LotID>[^"]*)" > // LotID',
+    'PanelID': r'<A\[\d+\] "(?P<PanelID>\d{9})" > // PanelID',
+    'SlotID': r' > // SlotID\s*4\. <A\[\d+\] "(?P<SlotID>\d+)"',
+    'PortID': r'<U1 (?P<PortID>\d+) > // PortID',
+    'SourcePortID': r'<U1 (?P<SourcePortID>\d+) > // Source PortID',
+    'DestPortID': r'<U1 (?P<DestPortID>\d+) > // Dest PortID',
+}
+
+# Literal every DEEP_PARSE_PATTERNS match contains; run first as a cheap Arrow-side filter
+DEEP_PARSE_PREFILTER = "//"
+
+def _parse_lines(lines) -> pd.DataFrame:
+    """
+    Parses a batch of raw log lines into a DataFrame of log entries.
+    The batch is joined and scanned once with the multiline line pattern, and values are
+    collected into one list per column rather than one dict per line.
+    """
+    timestamps, log_types = [], []
+    columns = {'timestamp': timestamps, 'log_type': log_types}
+    row = 0
+    # Joined with '\n' so lines ending in a bare '\r' still start a new entry
+    for match in LOG_LINE_PATTERN.finditer('\n'.join(lines)):
+        timestamps.append(match['timestamp'])
+        log_types.append(match['log_type'])
+        pairs = DETAILS_KEY_PATTERN.split(match['details'])
+        for key, value in zip(pairs[1::2], pairs[2::2]):
+            values = columns.get(key[:-1])
+            if values is None:
+                # Keys vary by message type, so a new column starts padded for the rows before it
+                values = columns[key[:-1]] = [None] * row
+            elif len(values) > row:
+                # A repeated key keeps its last value
+                values[row] = value.strip().strip('"')
+                continue
+            else:
+                values.extend([None] * (row - len(values)))
+            values.append(value.strip().strip('"'))
+        row += 1
+
+    if not row:
+        return pd.DataFrame()
+    for values in columns.values():
+        values.extend([None] * (row - len(values)))
+    return pd.DataFrame(columns)
+
+def _iter_batches(stream):
+    """
+    Yields lists of up to CHUNK_LINES lines from a text stream.
+    """
+    while True:
+        batch = list(itertools.islice(stream, CHUNK_LINES))
+        if not batch:
+            return
+        yield batch
+
+def _parse_workers() -> int:
+    """
+    Number of parser processes worth starting: the CPUs this process may actually run on
+    (its affinity mask and any cgroup v2 CPU quota), capped at MAX_PARSE_WORKERS.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return min(cpus, MAX_PARSE_WORKERS)
+
+def _parse_batches_in_pool(batches, workers: int) -> list:
+    """
+    Parses batches across worker processes, keeping at most two batches per worker in flight
+    so the file is still streamed rather than read into memory up front.
+    """
+    frames = []
+    pending = collections.deque()
+    # Spawn rather than fork: the Streamlit server that calls this is multi-threaded
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for batch in batches:
+            if len(pending) >= 2 * workers:
+                frames.append(pending.popleft().result())
+            pending.append(executor.submit(_parse_lines, batch))
+        frames.extend(future.result() for future in pending)
+    return frames
 
 def parse_log_file(uploaded_file) -> pd.DataFrame:
     """
     Parses an uploaded SECS/GEM log file and returns a structured Pandas DataFrame.
+    The file is streamed in batches of lines; files of several batches are parsed across
+    worker processes when more than one CPU is available.
     """
-    log_pattern = re.compile(
-        r'^(?P<timestamp>\d{4}/\d{2}/\d{2}\s\d{2}:\d{2}:\d{2}\.\d{6}),'
-        r'\[(?P<log_type>[^\]]+)\],'
-        r'(?P<details>.*)$'
-    )
-    
-    parsed_data = []
-    for line in uploaded_file.getvalue().decode("utf-8").splitlines():
-        match = log_pattern.match(line.strip())
-        if match:
-            log_entry = match.groupdict()
-            details_str = log_entry['details']
-            
-            pairs = re.split(r'(\w+=)', details_str)[1:]
-            details = dict(zip(pairs[0::2], pairs[1::2]))
-            details_cleaned = {k.replace('=', ''): v.strip().strip('"') for k, v in details.items()}
-            
-            log_entry.update(details_cleaned)
-            del log_entry['details']
-            parsed_data.append(log_entry)
-
-    if not parsed_data:
+    uploaded_file.seek(0)
+    stream = io.TextIOWrapper(uploaded_file, encoding="utf-8", newline="")
+    try:
+        batches = _iter_batches(stream)
+        head = list(itertools.islice(batches, POOL_MIN_BATCHES))
+        batches = itertools.chain(head, batches)
+        workers = _parse_workers()
+        if len(head) < POOL_MIN_BATCHES or workers == 1:
+            # Short files, or a single CPU, are parsed inline: worker start-up would cost more
+            frames = [_parse_lines(batch) for batch in batches]
+        else:
+            frames = _parse_batches_in_pool(batches, workers)
+    finally:
+        # Detach so closing the wrapper does not close the uploaded file
+        stream.detach()
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
         return pd.DataFrame()
 
-    df = pd.DataFrame(parsed_data)
+    df = pd.concat(frames, ignore_index=True)
     return clean_and_enrich_data(df)
 
+def _to_integer_ids(values: pd.Series, bits: int) -> pd.Series:
+    """
+    Converts parsed ID strings to a nullable integer dtype of the given width. Falls back to
+    Int64 when a value doesn't fit, and leaves the numbers as parsed when none are present or
+    any is fractional, so nothing is wrapped or truncated.
+    """
+    numbers = pd.to_numeric(values, errors='coerce')
+    present = numbers.dropna()
+    if present.empty or (present % 1 != 0).any():
+        return numbers
+
+    largest = present.abs().max()
+    if largest < 2 ** (bits - 1):
+        return numbers.astype(f'Int{bits}')
+    if largest < 2 ** 63:
+        return numbers.astype('Int64')
+    return numbers
+
+def _extract_regex(messages: pd.Series, pattern: str) -> pd.Series:
+    """
+    Extracts the named group of `pattern` from Arrow-backed strings with RE2, directly over the
+    Arrow buffers: linear-time, with no per-row Python calls. Rows without a match are missing.
+    """
+    matches = pc.extract_regex(pa.array(messages), pattern=pattern)
+    return pd.Series(pc.struct_field(matches, [0]), index=messages.index, dtype='string[pyarrow]')
+
 def clean_and_enrich_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Cleans, transforms, and enriches the DataFrame with deep parsing for maintenance analysis.
     """
     # --- Basic Cleaning ---
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # Arrow-backed strings let .str scans run in Arrow's compute kernels over contiguous buffers
+    df = df.astype({col: 'string[pyarrow]' for col in df.select_dtypes(include=['object', 'string']).columns})
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='%Y/%m/%d %H:%M:%S.%f', cache=True)
+    # Put rows in time order before anything is filled or propagated, so forward fills and the
+    # end-of-log state follow the clock even when the file's lines are out of order
+    if not df['timestamp'].is_monotonic_increasing:
+        df = df.sort_values('timestamp', kind='mergesort', ignore_index=True)
     if 'TransactionID' in df.columns:
-        df['TransactionID'] = pd.to_numeric(df['TransactionID'], errors='coerce')
+        df['TransactionID'] = _to_integer_ids(df['TransactionID'], bits=32)
 
     # --- Feature Extraction from 'Message' Column ---
     if 'Message' in df.columns:
         # Performance Metric
-        time_pattern = r"Process time of the transaction\(ID=\d+\) is ([\d.-]+) msec"
-        df['ProcessTime_ms'] = df['Message'].str.extract(time_pattern, expand=False).astype(float)
+        process_time = _extract_regex(df['Message'], PROCESS_TIME_PATTERN)
+        df['ProcessTime_ms'] = pd.to_numeric(process_time, errors='coerce').astype('float32')
+
+        # Panel throughput flag, computed once so the dashboard only needs a sum
+        df['is_panel_event'] = df['Message'].str.contains(PANEL_EVENT_PATTERN, case=False, na=False)
 
         # --- DEEP PARSING FOR MAINTENANCE ---
-        # Using regex to find specific patterns within the complex 'Message' string
-        df['OperatorID'] = df['Message'].str.extract(r"<A\[\d+\] \"(\d{5})\" > \/\/ OperatorID")
-        df['MagazineID'] = df['Message'].str.extract(r"<A\[\d+\] \"(M\d+)\" > \/\/ MagazineID")
-        df['LotID'] = df['Message'].str.extract(r"<A\[\d+\] \"(.*?)\" > \/\/ LotID")
-        df['PanelID'] = df['Message'].str.extract(r"<A\[\d+\] \"(\d{9})\" > \/\/ PanelID")
-        df['SlotID'] = df['Message'].str.extract(r" > \/\/ SlotID\s*4\. <A\[\d+\] \"(\d+)\"") # More complex pattern
-        df['PortID'] = df['Message'].str.extract(r"<U1 (\d+) > \/\/ PortID")
-        df['SourcePortID'] = df['Message'].str.extract(r"<U1 (\d+) > \/\/ Source PortID")
-        df['DestPortID'] = df['Message'].str.extract(r"<U1 (\d+) > \/\/ Dest PortID")
-        
-        # Track Machine Control State (Local/Remote)
-        df['ControlStateChange'] = df['Message'].str.extract(r"(LOCAL|REMOTE)")
-        df['ControlState'] = df['ControlStateChange'].ffill().bfill()
+        # Using regex to find specific patterns within the complex 'Message' string. Only messages
+        # carrying SML comments can match, so the rest are skipped up front.
+        has_fields = df['Message'].str.contains(DEEP_PARSE_PREFILTER, regex=False, na=False)
+        sml_messages = df.loc[has_fields, 'Message']
+        deep_fields = pd.DataFrame(
+            {col: _extract_regex(sml_messages, pattern) for col, pattern in DEEP_PARSE_PATTERNS.items()},
+            index=sml_messages.index,
+        ).reindex(df.index)
+
+        # Track Machine Control State (Local/Remote), without keeping the raw changes
+        df['ControlState'] = _extract_regex(df['Message'], CONTROL_STATE_PATTERN).ffill().bfill()
+        # Deep-parse values replace any same-named key=value columns from the line header
+        df[list(deep_fields.columns)] = deep_fields
+        # Slot numbers are small integers; PanelID stays text because IDs may carry leading zeros
+        if 'SlotID' in df.columns:
+            df['SlotID'] = _to_integer_ids(df['SlotID'], bits=16)
         
     # --- Data Propagation ---
     # Forward fill key context data to make it available for all rows
-    cols_to_fill = ['OperatorID', 'MagazineID', 'LotID', 'PortID', 'ControlState']
-    for col in cols_to_fill:
-        if col in df.columns:
-            df[col] = df[col].ffill()
+    cols_to_fill = [col for col in ['OperatorID', 'MagazineID', 'LotID', 'PortID'] if col in df.columns]
+    df[cols_to_fill] = df[cols_to_fill].ffill()
+
+    # Record the last known machine state (the frame is in time order here)
+    state_cols = [col for col in ['ControlState', 'OperatorID', 'LotID', 'MagazineID'] if col in df.columns]
+    last_state = df[state_cols].iloc[-1].dropna().to_dict()
 
-    # Propagate MessageName across transaction groups
+    # Propagate MessageName across transaction groups: rows without one take the transaction's first
     if 'TransactionID' in df.columns and 'MessageName' in df.columns:
-        df = df.sort_values(by=['TransactionID', 'timestamp'])
-        df['MessageName'] = df.groupby('TransactionID')['MessageName'].ffill().bfill()
-        
+        name_map = df.groupby('TransactionID', sort=False)['MessageName'].first()
+        df['MessageName'] = df['MessageName'].fillna(df['TransactionID'].map(name_map))
+
+    # --- Compact Storage ---
+    # Low-cardinality identifiers become categoricals so groupby and scans work on integer codes
+    cols_to_categorize = ['MessageName', 'log_type', 'ControlState', 'OperatorID', 'LotID', 'MagazineID',
+                          'PortID', 'SourcePortID', 'DestPortID']
+    for col in cols_to_categorize:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    # --- Time Index ---
+    # Index by time, so time windows can be sliced with df.loc[start:end]. The index is left
+    # unnamed so 'timestamp' still refers unambiguously to the column.
+    df.index = pd.DatetimeIndex(df['timestamp']).rename(None)
+
+    df.attrs['last_state'] = last_state
     return df
 
 # --- All other analysis functions (get_summary_statistics, analyze_alarms, etc.) remain the same ---